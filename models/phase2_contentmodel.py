@@ -1,14 +1,33 @@
 # models/phase2_contentmodel.py
 from __future__ import annotations
 from pathlib import Path
+import threading
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+from .quantization import QuantizedSparse, check_storage_dtype, default_storage_dtype
 
 _VECT = None
-_MATRIX = None
+_MATRIX = None  # QuantizedSparse, L2-normalized TF-IDF rows
 _MOVIES = None
+_MOVIE_IDS = None  # every indexed movieId, base and tail
+_ADDED_SINCE_FIT = 0  # titles appended by add_movies since the last TF-IDF fit
+_STORAGE = default_storage_dtype()
+_LOCK = threading.RLock()  # guards every read and rebind of the globals above
+_COMPACTING = False
+
+def set_storage_dtype(dtype: str):
+    """
+    Selects how the TF-IDF matrix values are stored: 'float64', 'float16'
+    or 'int8'. The cached model is dropped and rebuilt on next use.
+    """
+    global _STORAGE, _MATRIX
+    with _LOCK:
+        _STORAGE = check_storage_dtype(dtype)
+        _MATRIX = None
 
 def _load_movies(root: Path) -> pd.DataFrame:
     # Prefer prepared CSV from Phase 1
@@ -20,42 +39,254 @@ def _load_movies(root: Path) -> pd.DataFrame:
     return pd.read_csv(root / "data" / "ml-1m" / "prepared" / "movies.csv")
 
 def _ensure_model(root: Path):
-    global _VECT, _MATRIX, _MOVIES
-    if _MATRIX is not None and _MOVIES is not None:
-        return
-    _MOVIES = _load_movies(root)
-    corpus = _MOVIES["tokens"].fillna("")
-    _VECT = TfidfVectorizer(min_df=2, stop_words="english")
-    _MATRIX = _VECT.fit_transform(corpus)
+    global _VECT, _MATRIX, _MOVIES, _MOVIE_IDS, _ADDED_SINCE_FIT
+    with _LOCK:
+        if _MATRIX is not None:
+            return
+        if _MOVIES is None:
+            _MOVIES = _load_movies(root)
+            _MOVIE_IDS = set(_MOVIES["movieId"])
+        _VECT, tfidf = _fit_tfidf(_MOVIES)
+        _MATRIX = QuantizedSparse.from_csr(tfidf, _STORAGE)
+        _ADDED_SINCE_FIT = 0
+
+def _fit_tfidf(movies: pd.DataFrame):
+    corpus = movies["tokens"].fillna("")
+    vect = TfidfVectorizer(min_df=2, stop_words="english")
+    return vect, vect.fit_transform(corpus)
+
+def _snapshot(root: Path):
+    """Consistent (vectorizer, matrix, movies), building the model if needed."""
+    with _LOCK:
+        _ensure_model(root)
+        return _VECT, _MATRIX, _MOVIES
+
+def add_movies(new_movies: pd.DataFrame) -> int:
+    """
+    Appends new titles to the content index without refitting TF-IDF.
+    They are vectorized with the current vocabulary and IDF weights, so
+    terms unseen at fit time are ignored until the next compaction.
+    Expects 'movieId', 'title' and 'genres' (or ready-made 'tokens').
+    Titles whose movieId is already indexed are skipped.
+    Vectorizing and appending matrix rows scales with the new titles only;
+    the movies frame is still copied once per call (one O(catalogue) concat,
+    no refit), so batch daily additions into a single call.
+    Returns the number of titles added.
+    """
+    global _MATRIX, _MOVIES, _ADDED_SINCE_FIT
+    root = Path(__file__).resolve().parents[1]
+
+    new = pd.DataFrame(new_movies).drop_duplicates("movieId")
+    if "tokens" not in new.columns:
+        # same token recipe as phase 1
+        new["tokens"] = (new["title"].fillna("") + " " + new["genres"].fillna("")).str.lower()
+
+    with _LOCK:
+        _ensure_model(root)
+        new = new[~new["movieId"].isin(_MOVIE_IDS)]
+        if new.empty:
+            return 0
+        rows = QuantizedSparse.from_csr(_VECT.transform(new["tokens"].fillna("")), _STORAGE)
+        _MATRIX = _MATRIX.append(rows)
+        _MOVIES = pd.concat([_MOVIES, new.reindex(columns=_MOVIES.columns)], ignore_index=True)
+        _MOVIE_IDS.update(new["movieId"])
+        _ADDED_SINCE_FIT += len(new)
+    return len(new)
+
+def compact_content_index(background: bool = False):
+    """
+    Refits TF-IDF over the whole catalogue, including titles added with
+    add_movies, and swaps the new index in atomically. Lookups keep using
+    the old index while the refit runs. Does nothing if no titles were added
+    since the last fit. With background=True the refit runs in a daemon
+    thread, which is returned.
+    """
+    global _VECT, _MATRIX, _COMPACTING, _ADDED_SINCE_FIT
+    if background:
+        t = threading.Thread(target=compact_content_index, daemon=True)
+        t.start()
+        return t
+
+    root = Path(__file__).resolve().parents[1]
+    with _LOCK:
+        if _COMPACTING:
+            return None
+        if _MATRIX is None:
+            # a cold build is already a full fit
+            _ensure_model(root)
+            return None
+        if _ADDED_SINCE_FIT == 0:
+            return None
+        _COMPACTING = True
+        movies, storage, folded = _MOVIES, _STORAGE, _ADDED_SINCE_FIT
+    try:
+        vect, tfidf = _fit_tfidf(movies)
+        matrix = QuantizedSparse.from_csr(tfidf, storage)
+        with _LOCK:
+            if storage != _STORAGE:
+                # set_storage_dtype ran meanwhile; its rebuild wins
+                return None
+            # titles added while the refit was running
+            late = _MOVIES.iloc[len(movies):]
+            if not late.empty:
+                matrix = matrix.append(
+                    QuantizedSparse.from_csr(vect.transform(late["tokens"].fillna("")), storage)
+                )
+            _VECT, _MATRIX = vect, matrix
+            # late titles were vectorized with the new vocabulary but not fitted
+            _ADDED_SINCE_FIT -= folded
+    finally:
+        with _LOCK:
+            _COMPACTING = False
+    return None
+
+def schedule_compaction(interval_seconds: float) -> threading.Event:
+    """
+    Runs compact_content_index every interval_seconds in a daemon thread.
+    Set the returned event to stop it.
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval_seconds):
+            try:
+                compact_content_index()
+            except Exception as e:
+                print(f"Content index compaction failed: {e}")
+
+    threading.Thread(target=loop, daemon=True).start()
+    return stop
+
+def _similar_to(matrix: QuantizedSparse, idx: int) -> np.ndarray:
+    # Rows are L2-normalized, so the dot product is the cosine similarity
+    return matrix.dot(matrix.rows(idx).T).ravel()
+
+def _top_matches(sims: np.ndarray, exclude, top_n: int) -> np.ndarray:
+    # Partial selection of top_n + len(exclude) candidates; only those are sorted
+    exclude = np.atleast_1d(exclude)
+    k = min(top_n + len(exclude), len(sims))
+    if top_n <= 0 or k == 0:
+        return np.empty(0, dtype=np.intp)
+    cand = np.argpartition(-sims, k - 1)[:k] if k < len(sims) else np.arange(len(sims))
+    cand = cand[~np.isin(cand, exclude)]
+    return cand[np.lexsort((cand, -sims[cand]))][:top_n]  # ties by row, as before
+
+def _resolve_titles(vect, matrix: QuantizedSparse, movies: pd.DataFrame, titles) -> dict:
+    """
+    Maps each distinct title to a row index: exact (case-insensitive) title
+    first, in one lookup for all titles; then first literal substring match;
+    then the best TF-IDF match to the title tokens, all fallbacks sharing one
+    product. Titles with no token overlap at all are left out.
+    """
+    titles = list(dict.fromkeys(titles))
+    lowered = movies["title"].fillna("").str.lower()
+    exact = lowered.drop_duplicates()  # first row wins, like the substring path
+    pos = pd.Index(exact.to_numpy()).get_indexer([t.lower() for t in titles])
+
+    resolved, misses = {}, []
+    for t, p in zip(titles, pos):
+        if p >= 0:
+            resolved[t] = int(exact.index[p])
+            continue
+        matches = lowered.index[lowered.str.contains(t.lower(), regex=False)]
+        if len(matches):
+            resolved[t] = int(matches[0])
+        else:
+            misses.append(t)
+    if misses:
+        sims = matrix.dot(vect.transform([t.lower() for t in misses]).T)
+        best = sims.argmax(axis=0)
+        for j, t in enumerate(misses):
+            if sims[best[j], j] > 0:
+                resolved[t] = int(best[j])
+    return resolved
+
+def _as_weighted(query) -> dict:
+    # A watch-list is either a list of titles or a {title: weight} mapping;
+    # seeds without a positive weight contribute nothing and are dropped
+    if isinstance(query, dict):
+        return {str(t): float(w) for t, w in query.items() if t and float(w) > 0}
+    if isinstance(query, str):
+        query = [query]
+    return {str(t): 1.0 for t in query if t}
 
 def get_content_recommendations(movie_title: str, top_n: int = 10) -> pd.DataFrame:
     """
     Returns DataFrame: ['title','score'] best matches to the input title.
     """
     root = Path(__file__).resolve().parents[1]
-    _ensure_model(root)
-    movies = _MOVIES
+    vect, matrix, movies = _snapshot(root)
 
     if not movie_title:
         return pd.DataFrame(columns=["title", "score"])
 
-    # Find the closest title index (simple exact/contains match; can be improved)
-    matches = movies[movies["title"].str.contains(movie_title, case=False, na=False)]
-    if matches.empty:
-        # try fuzzy-like fallback: pick highest TF-IDF similarity to the query tokens
-        q_vec = _VECT.transform([movie_title.lower()])
-        sims = cosine_similarity(q_vec, _MATRIX).ravel()
-        idx = int(np.argmax(sims))
-    else:
-        idx = matches.index[0]
+    # Exact title, then substring, then best TF-IDF match to the query tokens
+    resolved = _resolve_titles(vect, matrix, movies, [movie_title])
+    if movie_title not in resolved:
+        return pd.DataFrame(columns=["title", "score"])
+    idx = resolved[movie_title]
 
-    sims = cosine_similarity(_MATRIX[idx], _MATRIX).ravel()
-    order = np.argsort(-sims)
+    sims = _similar_to(matrix, idx)
+    order = _top_matches(sims, idx, top_n)  # skip the query itself
 
     recs = (
         movies.iloc[order][["title"]]
         .assign(score=sims[order])
-        .iloc[1 : top_n + 1]  # skip the query itself
         .reset_index(drop=True)
     )
     return recs
+
+def get_batch_watchlist_recommendations(queries, top_n: int = 10) -> list[pd.DataFrame]:
+    """
+    Content recommendations for many watch-lists at once. Each query is a
+    list of titles or a {title: weight} mapping; its seeds are combined
+    into one weighted, L2-normalized TF-IDF vector, and all queries are
+    scored with a single sparse product. Seeds are never recommended.
+    Returns one ['title','score'] DataFrame per query, in order.
+    """
+    root = Path(__file__).resolve().parents[1]
+    vect, matrix, movies = _snapshot(root)
+
+    queries = [_as_weighted(q) for q in queries]
+    resolved = _resolve_titles(vect, matrix, movies, [t for q in queries for t in q])
+
+    # seed weights: one row per query, one column per distinct seed movie
+    seeds = sorted(set(resolved.values()))
+    col = {idx: j for j, idx in enumerate(seeds)}
+    r, c, w = [], [], []
+    for i, q in enumerate(queries):
+        for t, weight in q.items():
+            if t in resolved:
+                r.append(i)
+                c.append(col[resolved[t]])
+                w.append(weight)
+    empty = pd.DataFrame(columns=["title", "score"])
+    if not seeds:
+        return [empty.copy() for _ in queries]
+
+    weights = sparse.csr_matrix((w, (r, c)), shape=(len(queries), len(seeds)))
+    profiles = weights @ matrix.rows(seeds)
+    has_profile = np.asarray(abs(profiles).sum(axis=1)).ravel() > 0
+    sims = matrix.dot(normalize(profiles).T)  # items x queries
+
+    out = []
+    for i in range(len(queries)):
+        own = [seeds[j] for j in weights.indices[weights.indptr[i]:weights.indptr[i + 1]]]
+        if not own or not has_profile[i]:
+            # no seeds, or seeds with no known terms: nothing to rank against
+            out.append(empty.copy())
+            continue
+        order = _top_matches(sims[:, i], own, top_n)
+        out.append(
+            movies.iloc[order][["title"]]
+            .assign(score=sims[order, i])
+            .reset_index(drop=True)
+        )
+    return out
+
+def get_watchlist_recommendations(titles, top_n: int = 10) -> pd.DataFrame:
+    """
+    Returns DataFrame: ['title','score'] best matches to a whole watch-list,
+    given as a list of titles or a {title: weight} mapping.
+    """
+    return get_batch_watchlist_recommendations([titles], top_n=top_n)[0]
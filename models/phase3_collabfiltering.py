@@ -3,12 +3,24 @@ from __future__ import annotations
 from pathlib import Path
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+from .quantization import QuantizedMatrix, check_storage_dtype, default_storage_dtype
 
 _MOVIES = None
 _RATINGS = None
-_ITEM_SIM = None
+_ITEM_SIM = None  # QuantizedMatrix, item x item, ordered like _UI.columns
 _UI = None
+_STORAGE = default_storage_dtype()
+
+def set_storage_dtype(dtype: str):
+    """
+    Selects how the item-similarity matrix is stored: 'float64', 'float16'
+    or 'int8'. The cached model is dropped and rebuilt on next use.
+    """
+    global _STORAGE, _ITEM_SIM
+    _STORAGE = check_storage_dtype(dtype)
+    _ITEM_SIM = None
 
 def _load_base(root: Path):
     movies_p = root / "data" / "ml-1m" / "prepared" / "movies.csv"
@@ -20,18 +32,50 @@ def _load_base(root: Path):
     ratings = pd.read_csv(ratings_p)
     return movies, ratings
 
+def _build_item_sim(ui: pd.DataFrame, dtype: str = "float64") -> QuantizedMatrix:
+    # cosine similarity between items (movies), computed a block of rows at a
+    # time so the quantized formats never materialize the float64 matrix
+    items = normalize(ui.to_numpy(dtype=np.float64).T)
+    n = items.shape[0]
+
+    def block(a: int, b: int) -> np.ndarray:
+        sim = items[a:b] @ items.T
+        # Self-similarity is always 1 and would pin every int8 row scale to
+        # 1/127; it never scores anyway since rated items are zeroed.
+        sim[np.arange(b - a), np.arange(a, b)] = 0.0
+        return sim
+
+    return QuantizedMatrix.from_blocks((n, n), block, dtype)
+
+def _ensure_ui(root: Path):
+    # user x item rating matrix, without building the similarity model
+    global _MOVIES, _RATINGS, _UI
+    if _UI is None:
+        _MOVIES, _RATINGS = _load_base(root)
+        ui = _RATINGS.pivot_table(index="userId", columns="movieId", values="rating")
+        _UI = ui.fillna(0.0)
+
 def _ensure_item_model(root: Path):
-    global _MOVIES, _RATINGS, _UI, _ITEM_SIM
+    global _ITEM_SIM
     if _ITEM_SIM is not None:
         return
-    _MOVIES, _RATINGS = _load_base(root)
-    ui = _RATINGS.pivot_table(index="userId", columns="movieId", values="rating")
-    ui = ui.fillna(0.0)
-    _UI = ui
-    # cosine similarity between items (movies)
-    _ITEM_SIM = cosine_similarity(ui.T)  # item x item
-    # store mapping
-    _ITEM_SIM = pd.DataFrame(_ITEM_SIM, index=ui.columns, columns=ui.columns)
+    _ensure_ui(root)
+    _ITEM_SIM = _build_item_sim(_UI, _STORAGE)
+
+def _score_user(item_sim: QuantizedMatrix, user_ratings: np.ndarray) -> np.ndarray:
+    """
+    Weighted sum of positive similarities to the user's rated items.
+    Already rated items score 0.
+    """
+    rated = np.flatnonzero(user_ratings > 0)
+    scores = item_sim.weighted_row_sum(rated, user_ratings[rated], clip_min=0.0)
+    scores[rated] = 0.0
+    return scores
+
+def _top_items(scores: np.ndarray, top_n: int) -> np.ndarray:
+    candidates = np.flatnonzero(scores > 0)
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order[:top_n]]
 
 def get_collab_recommendations(user_id: str | int, top_n: int = 10) -> pd.DataFrame:
     """
@@ -44,26 +88,19 @@ def get_collab_recommendations(user_id: str | int, top_n: int = 10) -> pd.DataFr
     if user_id not in _UI.index:
         return pd.DataFrame(columns=["title", "score"])
 
-    user_ratings = _UI.loc[user_id]
-    rated = user_ratings[user_ratings > 0]
-    if rated.empty:
+    user_ratings = _UI.loc[user_id].to_numpy()
+    if not (user_ratings > 0).any():
         return pd.DataFrame(columns=["title", "score"])
 
     # Score each unseen item by similarity to the user's rated items
-    scores = {}
-    for m_id, r in rated.items():
-        sims = _ITEM_SIM[m_id]
-        for target_id, sim in sims.items():
-            if user_ratings[target_id] == 0 and sim > 0:
-                scores[target_id] = scores.get(target_id, 0.0) + sim * r
-
-    if not scores:
+    scores = _score_user(_ITEM_SIM, user_ratings)
+    top = _top_items(scores, top_n)
+    if top.size == 0:
         return pd.DataFrame(columns=["title", "score"])
 
-    s = pd.Series(scores).sort_values(ascending=False).head(top_n)
     movies_lookup = _MOVIES.set_index("movieId")["title"]
     out = pd.DataFrame({
-        "title": [movies_lookup.get(mid, str(mid)) for mid in s.index],
-        "score": s.values
+        "title": [movies_lookup.get(mid, str(mid)) for mid in _UI.columns[top]],
+        "score": scores[top].astype(float)
     })
     return out
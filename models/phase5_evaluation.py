@@ -7,12 +7,20 @@ from sklearn.model_selection import train_test_split
 
 from .phase1_dataprep import prepare_ml1m
 from .phase3_collabfiltering import get_collab_recommendations
+from . import phase2_contentmodel as content
+from . import phase3_collabfiltering as collab
+from .quantization import QuantizedSparse
 
 def precision_at_k(recommended: list[str], relevant: set[str], k: int) -> float:
     if k == 0:
         return 0.0
     return sum(1 for x in recommended[:k] if x in relevant) / k
 
+def overlap_at_k(a, b, k: int) -> float:
+    if k == 0:
+        return 0.0
+    return len(set(list(a)[:k]) & set(list(b)[:k])) / k
+
 def evaluate_cf_precision_k(k: int = 10, sample_users: int = 50) -> float:
     """
     Quick-and-simple: split each user's ratings into train/test;
@@ -51,9 +59,66 @@ def evaluate_cf_precision_k(k: int = 10, sample_users: int = 50) -> float:
 
     return float(np.mean(precisions)) if precisions else 0.0
 
+def _storage_row(name: str, dtype: str, mat, overlaps: list[float]) -> dict:
+    return {
+        "matrix": name,
+        "storage": dtype,
+        "mbytes": mat.nbytes / 2**20,
+        "full_mbytes": mat.full_nbytes / 2**20,
+        "saved_pct": 100.0 * (1 - mat.nbytes / mat.full_nbytes),
+        "overlap_at_k": float(np.mean(overlaps)) if overlaps else 0.0,
+    }
+
+def evaluate_storage(dtypes=("float16", "int8"), k: int = 10,
+                     sample_users: int = 50, sample_titles: int = 50) -> pd.DataFrame:
+    """
+    Memory footprint of each storage format and its ranking agreement
+    (overlap@k) with the full-precision models, for the phase 3 item
+    similarities and the phase 2 TF-IDF matrix.
+    """
+    root = Path(__file__).resolve().parents[1]
+    rows = []
+
+    # Phase 3: item-item similarity
+    collab._ensure_ui(root)
+    ui = collab._UI
+    rng = np.random.default_rng(42)
+    uids = rng.choice(len(ui.index), size=min(sample_users, len(ui.index)), replace=False)
+    user_ratings = [ui.iloc[u].to_numpy() for u in uids]
+
+    def collab_top(sim):
+        return [collab._top_items(collab._score_user(sim, r), k) for r in user_ratings]
+
+    full = collab._build_item_sim(ui, "float64")
+    ref = collab_top(full)
+    rows.append(_storage_row("item_sim", "float64", full, [1.0] * len(ref)))
+    del full
+    for dtype in dtypes:
+        sim = collab._build_item_sim(ui, dtype)
+        rows.append(_storage_row("item_sim", dtype, sim,
+                                 [overlap_at_k(a, b, k) for a, b in zip(ref, collab_top(sim))]))
+
+    # Phase 2: TF-IDF content vectors
+    _, tfidf = content._fit_tfidf(content._load_movies(root))
+    idxs = rng.choice(tfidf.shape[0], size=min(sample_titles, tfidf.shape[0]), replace=False)
+
+    def content_top(mat):
+        return [content._top_matches(content._similar_to(mat, i), i, k) for i in idxs]
+
+    full = QuantizedSparse.from_csr(tfidf, "float64")
+    ref = content_top(full)
+    rows.append(_storage_row("tfidf", "float64", full, [1.0] * len(ref)))
+    for dtype in dtypes:
+        mat = QuantizedSparse.from_csr(tfidf, dtype)
+        rows.append(_storage_row("tfidf", dtype, mat,
+                                 [overlap_at_k(a, b, k) for a, b in zip(ref, content_top(mat))]))
+
+    return pd.DataFrame(rows)
+
 def main():
     p_at_10 = evaluate_cf_precision_k(k=10, sample_users=50)
     print(f"Estimated Precision@10: {p_at_10:.3f}")
+    print(evaluate_storage(k=10).to_string(index=False, float_format="{:.3f}".format))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,235 @@
+# models/quantization.py
+from __future__ import annotations
+import os
+import numpy as np
+from scipy import sparse
+
+# Storage formats for similarity / embedding matrices.
+#   float64 - full precision (default)
+#   float16 - half precision, 4x smaller
+#   int8    - per-row scaled int8 (value = q * scale[row]), 8x smaller
+STORAGE_DTYPES = ("float64", "float16", "int8")
+BLOCK_ROWS = 256
+
+def check_storage_dtype(dtype: str) -> str:
+    dtype = str(dtype).lower()
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown storage dtype {dtype!r}; expected one of {STORAGE_DTYPES}.")
+    return dtype
+
+def default_storage_dtype() -> str:
+    # Lets worker processes opt in without code changes
+    return check_storage_dtype(os.environ.get("RECSYS_STORAGE_DTYPE", "float64"))
+
+def _row_scales(amax: np.ndarray) -> np.ndarray:
+    return np.where(amax > 0, amax / 127.0, 1.0).astype(np.float32)
+
+def _to_int8(values: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return np.rint(values / scales).clip(-127, 127).astype(np.int8)
+
+def _work_dtype(dtype: str):
+    # Full-precision storage stays float64 so it can serve as the reference model
+    return np.float64 if dtype == "float64" else np.float32
+
+
+class QuantizedMatrix:
+    """
+    Dense 2-D matrix stored as float64, float16 or per-row scaled int8.
+    Rows are dequantized on demand, a block at a time.
+    """
+
+    def __init__(self, values: np.ndarray, scales: np.ndarray | None = None):
+        self.values = values
+        self.scales = scales
+
+    @classmethod
+    def from_blocks(cls, shape: tuple[int, int], make_block, dtype: str = "float64",
+                    block_rows: int = BLOCK_ROWS) -> "QuantizedMatrix":
+        """
+        Builds the matrix from make_block(start, stop) -> dense rows [start, stop),
+        quantizing each block as it arrives so the full-precision matrix
+        never has to be held in memory.
+        """
+        dtype = check_storage_dtype(dtype)
+        n_rows = shape[0]
+        values = np.empty(shape, dtype=np.int8 if dtype == "int8" else dtype)
+        scales = np.empty(n_rows, dtype=np.float32) if dtype == "int8" else None
+        for start in range(0, n_rows, block_rows):
+            stop = min(start + block_rows, n_rows)
+            block = np.asarray(make_block(start, stop))
+            if scales is None:
+                values[start:stop] = block
+            else:
+                s = _row_scales(np.abs(block).max(axis=1))
+                values[start:stop] = _to_int8(block, s[:, None])
+                scales[start:stop] = s
+        return cls(values, scales)
+
+    @classmethod
+    def from_array(cls, arr, dtype: str = "float64") -> "QuantizedMatrix":
+        arr = np.asarray(arr)
+        return cls.from_blocks(arr.shape, lambda a, b: arr[a:b], dtype)
+
+    @property
+    def dtype(self) -> str:
+        return "int8" if self.scales is not None else self.values.dtype.name
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.values.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @property
+    def full_nbytes(self) -> int:
+        return self.values.size * np.dtype(np.float64).itemsize
+
+    def rows(self, idx) -> np.ndarray:
+        """Dequantized copy of the selected rows."""
+        block = self.values[idx].astype(_work_dtype(self.dtype))
+        if self.scales is not None:
+            block *= self.scales[idx][..., None]
+        return block
+
+    def weighted_row_sum(self, idx, weights, clip_min: float | None = None,
+                         block_rows: int = BLOCK_ROWS) -> np.ndarray:
+        """
+        sum_i weights[i] * row[idx[i]], dequantizing block_rows rows at a time.
+        With clip_min, entries below it are raised to clip_min first.
+        """
+        idx = np.asarray(idx)
+        weights = np.asarray(weights, dtype=_work_dtype(self.dtype))
+        out = np.zeros(self.shape[1], dtype=_work_dtype(self.dtype))
+        for start in range(0, len(idx), block_rows):
+            block = self.rows(idx[start:start + block_rows])
+            if clip_min is not None:
+                np.maximum(block, clip_min, out=block)
+            out += weights[start:start + block_rows] @ block
+        return out
+
+
+class QuantizedSparse:
+    """
+    CSR matrix whose non-zero values are stored as float64, float16 or
+    per-row scaled int8. The sparsity structure is kept as is.
+
+    Rows added with append() are kept as separate tail segments, so appending
+    never copies the existing rows; from_csr() on a full refit folds them back.
+    """
+
+    def __init__(self, data: np.ndarray, indices: np.ndarray, indptr: np.ndarray,
+                 shape: tuple[int, int], scales: np.ndarray | None = None,
+                 tail: tuple["QuantizedSparse", ...] = ()):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.scales = scales
+        self.tail = tuple(tail)
+        self.base_rows = shape[0]
+        self.shape = (shape[0] + sum(t.shape[0] for t in self.tail), shape[1])
+
+    @classmethod
+    def from_csr(cls, mat, dtype: str = "float64") -> "QuantizedSparse":
+        dtype = check_storage_dtype(dtype)
+        mat = sparse.csr_matrix(mat)
+        mat.sum_duplicates()
+        scales = None
+        if dtype == "int8":
+            amax = np.zeros(mat.shape[0])
+            counts = np.diff(mat.indptr)
+            nonempty = counts > 0
+            amax[nonempty] = np.maximum.reduceat(np.abs(mat.data), mat.indptr[:-1][nonempty])
+            scales = _row_scales(amax)
+            data = _to_int8(mat.data, np.repeat(scales, counts))
+        else:
+            data = mat.data.astype(dtype)
+        return cls(data, mat.indices.copy(), mat.indptr.copy(), mat.shape, scales)
+
+    @property
+    def dtype(self) -> str:
+        return "int8" if self.scales is not None else self.data.dtype.name
+
+    @property
+    def nbytes(self) -> int:
+        n = self.data.nbytes + self.indices.nbytes + self.indptr.nbytes
+        n += self.scales.nbytes if self.scales is not None else 0
+        return n + sum(t.nbytes for t in self.tail)
+
+    @property
+    def full_nbytes(self) -> int:
+        n = self.data.size * np.dtype(np.float64).itemsize + self.indices.nbytes + self.indptr.nbytes
+        return n + sum(t.full_nbytes for t in self.tail)
+
+    def _segments(self) -> list[tuple[int, "QuantizedSparse"]]:
+        """(row offset, segment) pairs; every segment has an empty tail."""
+        base = QuantizedSparse(self.data, self.indices, self.indptr,
+                               (self.base_rows, self.shape[1]), self.scales)
+        out, offset = [(0, base)], self.base_rows
+        for t in self.tail:
+            out.append((offset, t))
+            offset += t.shape[0]
+        return out
+
+    def _block(self, start: int, stop: int) -> sparse.csr_matrix:
+        # Rows [start, stop) of the base segment
+        lo, hi = self.indptr[start], self.indptr[stop]
+        data = self.data[lo:hi].astype(_work_dtype(self.dtype))
+        if self.scales is not None:
+            data *= np.repeat(self.scales[start:stop], np.diff(self.indptr[start:stop + 1]))
+        return sparse.csr_matrix(
+            (data, self.indices[lo:hi], self.indptr[start:stop + 1] - lo),
+            shape=(stop - start, self.shape[1]),
+        )
+
+    def _gather(self, idx: np.ndarray) -> sparse.csr_matrix:
+        # Selected rows of the base segment, as one CSR built in a single pass
+        starts = self.indptr[idx]
+        counts = self.indptr[idx + 1] - starts
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        pos = np.arange(indptr[-1]) + np.repeat(starts - indptr[:-1], counts)
+        data = self.data[pos].astype(_work_dtype(self.dtype))
+        if self.scales is not None:
+            data *= np.repeat(self.scales[idx], counts)
+        return sparse.csr_matrix((data, self.indices[pos], indptr),
+                                 shape=(len(idx), self.shape[1]))
+
+    def append(self, other: "QuantizedSparse") -> "QuantizedSparse":
+        """
+        New matrix with other's rows stacked below these ones. The row arrays
+        are shared, not copied, so the cost depends only on other.
+        """
+        if other.dtype != self.dtype or other.shape[1] != self.shape[1]:
+            raise ValueError(f"Cannot append {other.dtype} {other.shape} rows to {self.dtype} {self.shape}.")
+        return QuantizedSparse(
+            self.data, self.indices, self.indptr, (self.base_rows, self.shape[1]), self.scales,
+            tail=self.tail + tuple(seg for _, seg in other._segments()),
+        )
+
+    def rows(self, idx) -> sparse.csr_matrix:
+        """Dequantized copy of the selected rows."""
+        idx = np.atleast_1d(np.asarray(idx, dtype=np.int64))
+        segments = self._segments()
+        if len(segments) == 1 or idx.size == 0:
+            return self._gather(idx)
+        offsets = np.array([off for off, _ in segments])
+        seg_of = np.searchsorted(offsets, idx, side="right") - 1
+        picked, parts = [], []
+        for s in np.unique(seg_of):
+            sel = np.flatnonzero(seg_of == s)
+            off, seg = segments[s]
+            picked.append(sel)
+            parts.append(seg._gather(idx[sel] - off))
+        stacked = sparse.vstack(parts, format="csr")
+        return stacked[np.argsort(np.concatenate(picked), kind="stable")]
+
+    def dot(self, other, block_rows: int = 4096) -> np.ndarray:
+        """Dense (self @ other), dequantizing block_rows rows at a time."""
+        out = np.empty((self.shape[0], other.shape[1]), dtype=_work_dtype(self.dtype))
+        for offset, seg in self._segments():
+            for start in range(0, seg.shape[0], block_rows):
+                stop = min(start + block_rows, seg.shape[0])
+                prod = seg._block(start, stop) @ other
+                out[offset + start:offset + stop] = prod.toarray() if sparse.issparse(prod) else prod
+        return out
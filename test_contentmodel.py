@@ -0,0 +1,185 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import models.phase2_contentmodel as content
+
+ROOT = Path(__file__).resolve().parent
+
+
+def _movies(rows):
+    df = pd.DataFrame(rows, columns=["movieId", "title", "genres"])
+    df["tokens"] = (df["title"] + " " + df["genres"]).str.lower()
+    return df
+
+
+MOVIES = _movies([
+    (1, "Toy Story (1995)", "Animation|Children's|Comedy"),
+    (2, "Jumanji (1995)", "Adventure|Children's|Fantasy"),
+    (3, "Toy Story 2 (1999)", "Animation|Children's|Comedy"),
+    (4, "Heat (1995)", "Action|Crime|Thriller"),
+    (5, "Alien (1979)", "Action|Horror|Sci-Fi"),
+    (6, "Aliens (1986)", "Action|Sci-Fi|Thriller"),
+    (7, "Shall We Dance? (1937)", "Comedy|Musical|Romance"),
+    (8, "Shall We Dance? (Shall We Dansu?) (1996)", "Comedy"),
+])
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(content, "_load_movies", lambda root: MOVIES.copy())
+    for name, value in {
+        "_VECT": None, "_MATRIX": None, "_MOVIES": None, "_MOVIE_IDS": None,
+        "_ADDED_SINCE_FIT": 0, "_COMPACTING": False, "_STORAGE": "float64",
+    }.items():
+        monkeypatch.setattr(content, name, value)
+
+
+def _fit_counter(monkeypatch, during=None):
+    calls = []
+    fit = content._fit_tfidf
+
+    def counting_fit(movies):
+        calls.append(len(movies))
+        result = fit(movies)
+        if during is not None and len(calls) == 2:
+            during()
+        return result
+
+    monkeypatch.setattr(content, "_fit_tfidf", counting_fit)
+    return calls
+
+
+def test_add_movies_skips_known_and_duplicate_ids():
+    new = pd.DataFrame({
+        "movieId": [1, 9, 9],
+        "title": ["Toy Story (1995)", "Toy Story 3 (2010)", "Toy Story 3 (2010)"],
+        "genres": ["Animation", "Animation|Children's|Comedy", "Animation|Children's|Comedy"],
+    })
+    assert content.add_movies(new) == 1
+    assert content.add_movies(new) == 0
+    assert len(content._MOVIES) == content._MATRIX.shape[0] == 9
+    assert len(content._MATRIX.tail) == 1
+    assert content._ADDED_SINCE_FIT == 1
+
+    recs = content.get_content_recommendations("Toy Story (1995)", top_n=2)
+    assert set(recs["title"]) == {"Toy Story 2 (1999)", "Toy Story 3 (2010)"}
+
+
+def test_compaction_refits_over_added_titles():
+    content.add_movies(pd.DataFrame({
+        "movieId": [9, 10],
+        "title": ["Pixar Shorts (2010)", "Pixar Classics (2011)"],
+        "genres": ["Animation", "Animation"],
+    }))
+    assert "pixar" not in content._VECT.vocabulary_
+
+    content.compact_content_index()
+    assert "pixar" in content._VECT.vocabulary_
+    assert content._MATRIX.tail == ()
+    assert content._MATRIX.shape[0] == 10
+    assert content._ADDED_SINCE_FIT == 0
+
+
+def test_compaction_skips_when_nothing_was_added(monkeypatch):
+    calls = _fit_counter(monkeypatch)
+    content.compact_content_index()  # cold: one build, no second fit
+    assert len(calls) == 1
+    vect = content._VECT
+    content.compact_content_index()
+    assert len(calls) == 1 and content._VECT is vect
+
+
+def test_titles_added_during_refit_are_kept(monkeypatch):
+    late = pd.DataFrame({"movieId": [20], "title": ["Toy Story 3 (2010)"],
+                         "genres": ["Animation|Children's|Comedy"]})
+    calls = _fit_counter(monkeypatch, during=lambda: content.add_movies(late))
+    content._snapshot(ROOT)
+    content.add_movies(pd.DataFrame({"movieId": [9], "title": ["Heat 2 (2026)"],
+                                     "genres": ["Action|Crime"]}))
+
+    content.compact_content_index()
+    assert len(calls) == 2
+    assert content._MATRIX.shape[0] == len(content._MOVIES) == 10
+    assert len(content._MATRIX.tail) == 1
+    assert content._ADDED_SINCE_FIT == 1  # the late title still awaits a fit
+
+
+def test_compaction_aborts_when_storage_changes(monkeypatch):
+    _fit_counter(monkeypatch, during=lambda: content.set_storage_dtype("float16"))
+    content._snapshot(ROOT)
+    content.add_movies(pd.DataFrame({"movieId": [9], "title": ["Heat 2 (2026)"],
+                                     "genres": ["Action|Crime"]}))
+
+    content.compact_content_index()
+    assert content._MATRIX is None
+    _, matrix, movies = content._snapshot(ROOT)
+    assert matrix.dtype == "float16" and matrix.shape[0] == len(movies) == 9
+
+
+def test_background_compaction_swaps_in():
+    content.add_movies(pd.DataFrame({"movieId": [9], "title": ["Heat 2 (2026)"],
+                                     "genres": ["Action|Crime"]}))
+    t = content.compact_content_index(background=True)
+    t.join(timeout=30)
+    assert not t.is_alive()
+    assert content._MATRIX.tail == () and content._MATRIX.shape[0] == 9
+
+
+def _resolve(titles):
+    vect, matrix, movies = content._snapshot(ROOT)
+    return content._resolve_titles(vect, matrix, movies, titles)
+
+
+def test_resolve_exact_substring_and_tfidf_fallback():
+    resolved = _resolve([
+        "Shall We Dance? (Shall We Dansu?) (1996)",  # exact, parentheses and all
+        "toy story (1995)",                          # exact, any case
+        "Alien (",                                    # literal substring, not a regex
+        "sci-fi horror",                              # TF-IDF fallback
+        "zzzz qqqq",                                  # no token overlap
+    ])
+    assert resolved["Shall We Dance? (Shall We Dansu?) (1996)"] == 7
+    assert resolved["toy story (1995)"] == 0
+    assert resolved["Alien ("] == 4
+    assert resolved["sci-fi horror"] in {4, 5}
+    assert "zzzz qqqq" not in resolved
+
+
+def test_single_title_uses_shared_lookup():
+    recs = content.get_content_recommendations("Toy Story (1995)", top_n=3)
+    assert recs["title"].iloc[0] == "Toy Story 2 (1999)"
+    assert "Toy Story (1995)" not in set(recs["title"])
+    assert content.get_content_recommendations("zzzz qqqq").empty
+    assert len(content.get_content_recommendations("(", top_n=2)) == 2
+
+
+def test_watchlist_excludes_seeds():
+    seeds = ["Toy Story (1995)", "Alien (1979)"]
+    recs = content.get_watchlist_recommendations(seeds, top_n=10)
+    assert len(recs) == len(MOVIES) - 2
+    assert not set(seeds) & set(recs["title"])
+
+
+def test_watchlist_ignores_zero_weights():
+    assert content.get_watchlist_recommendations({"Toy Story (1995)": 0}, top_n=4).empty
+    with_zero = content.get_watchlist_recommendations({"Heat (1995)": 1, "Toy Story (1995)": 0}, top_n=4)
+    pd.testing.assert_frame_equal(with_zero, content.get_watchlist_recommendations(["Heat (1995)"], top_n=4))
+
+
+def test_duplicate_seeds_sum_their_weights():
+    split = content.get_watchlist_recommendations(
+        {"Toy Story (1995)": 1, "toy story (1995)": 2, "Alien (1979)": 1}, top_n=5)
+    merged = content.get_watchlist_recommendations({"Toy Story (1995)": 3, "Alien (1979)": 1}, top_n=5)
+    pd.testing.assert_frame_equal(split, merged)
+
+
+def test_batch_matches_individual_queries():
+    queries = [["Toy Story (1995)"], {"Alien (1979)": 2, "Heat (1995)": 1}, ["zzzz qqqq"], []]
+    batch = content.get_batch_watchlist_recommendations(queries, top_n=3)
+    assert len(batch) == len(queries)
+    for q, got in zip(queries, batch):
+        pd.testing.assert_frame_equal(got, content.get_watchlist_recommendations(q, top_n=3))
+    single = content.get_content_recommendations("Toy Story (1995)", top_n=3)
+    pd.testing.assert_frame_equal(batch[0], single)
@@ -0,0 +1,67 @@
+import numpy as np
+from scipy import sparse
+
+from models.quantization import QuantizedMatrix, QuantizedSparse
+
+
+def _random_csr(n_rows=40, n_cols=30, density=0.2, seed=0):
+    mat = sparse.random(n_rows, n_cols, density=density, format="csr", random_state=seed)
+    mat.data -= 0.5
+    return mat
+
+
+def test_dense_float64_round_trip():
+    arr = np.random.default_rng(0).normal(size=(300, 20))
+    q = QuantizedMatrix.from_array(arr, "float64")
+    np.testing.assert_array_equal(q.rows(np.arange(300)), arr)
+    assert q.nbytes == q.full_nbytes
+
+
+def test_dense_int8_error_within_half_step_per_row():
+    arr = np.random.default_rng(1).normal(size=(50, 40)) * np.arange(1, 51)[:, None]
+    q = QuantizedMatrix.from_array(arr, "int8")
+    step = np.abs(arr).max(axis=1, keepdims=True) / 127
+    assert np.all(np.abs(q.rows(np.arange(50)) - arr) <= step / 2 * (1 + 1e-4))
+    assert q.nbytes < q.full_nbytes / 7
+
+
+def test_weighted_row_sum_matches_numpy():
+    arr = np.random.default_rng(2).normal(size=(600, 15))
+    q = QuantizedMatrix.from_array(arr, "float64")
+    idx = np.array([3, 599, 256, 0, 257])
+    w = np.array([1.0, 2.0, 0.5, 4.0, 3.0])
+    expected = w @ np.maximum(arr[idx], 0.0)
+    np.testing.assert_allclose(q.weighted_row_sum(idx, w, clip_min=0.0, block_rows=2), expected)
+
+
+def test_sparse_float64_round_trip():
+    mat = _random_csr()
+    q = QuantizedSparse.from_csr(mat, "float64")
+    np.testing.assert_array_equal(q.rows(np.arange(mat.shape[0])).toarray(), mat.toarray())
+    other = np.random.default_rng(3).normal(size=(mat.shape[1], 4))
+    np.testing.assert_allclose(q.dot(other, block_rows=7), mat @ other)
+
+
+def test_sparse_int8_handles_empty_rows():
+    mat = _random_csr().tolil()
+    mat[[0, 5, 39], :] = 0
+    mat = mat.tocsr()
+    mat.eliminate_zeros()
+    q = QuantizedSparse.from_csr(mat, "int8")
+    dense = mat.toarray()
+    step = np.abs(dense).max(axis=1, keepdims=True) / 127
+    out = q.rows(np.arange(mat.shape[0])).toarray()
+    assert np.all(np.abs(out - dense) <= step / 2 * (1 + 1e-4) + 1e-12)
+    assert not out[[0, 5, 39]].any()
+
+
+def test_append_then_rows_matches_vstack():
+    a, b, c = _random_csr(seed=4), _random_csr(n_rows=3, seed=5), _random_csr(n_rows=6, seed=6)
+    q = QuantizedSparse.from_csr(a, "float64")
+    q = q.append(QuantizedSparse.from_csr(b, "float64")).append(QuantizedSparse.from_csr(c, "float64"))
+    full = sparse.vstack([a, b, c], format="csr")
+    assert q.shape == full.shape
+    idx = np.array([42, 0, 45, 39, 40, 48, 42])
+    np.testing.assert_array_equal(q.rows(idx).toarray(), full[idx].toarray())
+    other = np.random.default_rng(7).normal(size=(full.shape[1], 2))
+    np.testing.assert_allclose(q.dot(other, block_rows=5), full @ other)